@@ -1,60 +1,64 @@
 import os
 import asyncio
-from fastapi import FastAPI, HTTPException, Depends, WebSocket, WebSocketDisconnect
+import concurrent.futures
+from fastapi import FastAPI, HTTPException, Depends, Query, WebSocket, WebSocketDisconnect
 from fastapi.middleware.cors import CORSMiddleware
-from pydantic import BaseModel
+from fastapi.responses import ORJSONResponse
 from typing import List, Optional
-from sqlalchemy import create_engine, Column, Integer, String, ForeignKey, Text
-from sqlalchemy.orm import declarative_base, sessionmaker, relationship, Session
+from contextlib import asynccontextmanager
+from sqlalchemy import select, insert, event
+from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker, AsyncSession
+from sqlalchemy.orm import selectinload, raiseload
+
+from models import (
+    Workflow,
+    Step,
+    StepCreate,
+    StepsBulkCreate,
+    StepResponse,
+    WorkflowCreate,
+    WorkflowResponse,
+    WorkflowPage,
+    create_db_and_tables,
+)
 
 # ------------------ Database Setup ------------------
-DATABASE_URL = "sqlite:///./workflows.db"  # Change if using Postgres/MySQL
-
-engine = create_engine(DATABASE_URL, connect_args={"check_same_thread": False})
-SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
-Base = declarative_base()
-
-class Workflow(Base):
-    __tablename__ = "workflows"
-    id = Column(Integer, primary_key=True, index=True)
-    name = Column(String, nullable=False)
-    description = Column(Text, nullable=True)
-    steps = relationship("Step", back_populates="workflow", cascade="all, delete-orphan")
-
-class Step(Base):
-    __tablename__ = "steps"
-    id = Column(Integer, primary_key=True, index=True)
-    workflow_id = Column(Integer, ForeignKey("workflows.id"))
-    prompt = Column(Text, nullable=False)
-    result = Column(Text, nullable=True)
-    progress = Column(Integer, nullable=True)
-    workflow = relationship("Workflow", back_populates="steps")
-
-Base.metadata.create_all(bind=engine)
-
-# ------------------ Schemas ------------------
-class StepCreate(BaseModel):
-    prompt: str
-    result: Optional[str] = None
-    progress: Optional[int] = None
-
-class StepResponse(StepCreate):
-    id: int
-    class Config:
-        orm_mode = True
-
-class WorkflowCreate(BaseModel):
-    name: str
-    description: Optional[str] = None
-
-class WorkflowResponse(WorkflowCreate):
-    id: int
-    steps: List[StepResponse] = []
-    class Config:
-        orm_mode = True
+DATABASE_URL = "sqlite+aiosqlite:///./workflows.db"  # Change if using Postgres (postgresql+asyncpg://)
+
+# Sized so ~100 concurrent requests plus running workflows don't exhaust the pool;
+# pre-ping/recycle drop connections a hosted database has closed underneath us
+engine = create_async_engine(
+    DATABASE_URL,
+    pool_size=20,
+    max_overflow=40,
+    pool_recycle=3600,
+    pool_pre_ping=True,
+)
+
+if engine.dialect.name == "sqlite":
+    # Runs once per new pooled connection: WAL lets readers proceed during writes and,
+    # with synchronous=NORMAL, a commit costs one fsync instead of two
+    @event.listens_for(engine.sync_engine, "connect")
+    def _sqlite_pragmas(dbapi_conn, _):
+        cur = dbapi_conn.cursor()
+        cur.execute("PRAGMA journal_mode=WAL")
+        cur.execute("PRAGMA synchronous=NORMAL")
+        cur.execute("PRAGMA temp_store=MEMORY")
+        cur.execute("PRAGMA mmap_size=268435456")
+        cur.execute("PRAGMA cache_size=-65536")
+        cur.close()
+
+SessionLocal = async_sessionmaker(engine, expire_on_commit=False, autoflush=False, class_=AsyncSession)
 
 # ------------------ FastAPI App ------------------
-app = FastAPI()
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    await create_db_and_tables(engine)
+    yield
+    await engine.dispose()
+    AI_POOL.shutdown(wait=False, cancel_futures=True)
+
+app = FastAPI(lifespan=lifespan, default_response_class=ORJSONResponse)
 
 # Health check (for Render)
 @app.get("/health", status_code=200)
@@ -70,49 +74,95 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# Steps are fetched with one extra IN-query per listing (not joined: one-to-many would
+# multiply parent rows); anything else left lazy raises instead of issuing hidden SELECTs.
+WORKFLOW_LOAD_OPTIONS = (selectinload(Workflow.steps), raiseload("*"))
+
+@asynccontextmanager
+async def session_scope():
+    """One session per unit of work; rolls back on error and always returns its connection."""
+    async with SessionLocal() as db:
+        try:
+            yield db
+        except Exception:
+            await db.rollback()
+            raise
+
 # Dependency
-def get_db():
-    db = SessionLocal()
-    try:
+async def get_db():
+    async with session_scope() as db:
         yield db
-    finally:
-        db.close()
+
+async def workflow_exists(db: AsyncSession, workflow_id: int) -> bool:
+    # Selects only the primary key: no description Text fetch, no ORM object built
+    return (await db.execute(select(Workflow.id).where(Workflow.id == workflow_id))).scalar() is not None
 
 # ------------------ Workflow Routes ------------------
-@app.get("/api/workflows", response_model=List[WorkflowResponse])
-def get_workflows(db: Session = Depends(get_db)):
-    return db.query(Workflow).all()
+# Keyset pagination: each page is an index seek past the last id seen, so cost per page
+# stays constant however deep the client pages (unlike OFFSET)
+@app.get("/api/workflows", response_model=WorkflowPage)
+async def get_workflows(
+    cursor: int = Query(0, ge=0),
+    limit: int = Query(50, ge=1, le=500),
+    db: AsyncSession = Depends(get_db),
+):
+    items = (await db.execute(
+        select(Workflow)
+        .where(Workflow.id > cursor)
+        .order_by(Workflow.id)
+        .limit(limit)
+        .options(*WORKFLOW_LOAD_OPTIONS)
+    )).scalars().all()
+    # A short page means there is nothing after it
+    next_cursor = items[-1].id if len(items) == limit else None
+    return {"items": items, "next_cursor": next_cursor}
 
 @app.post("/api/workflows", response_model=WorkflowResponse)
-def create_workflow(workflow: WorkflowCreate, db: Session = Depends(get_db)):
-    db_workflow = Workflow(**workflow.dict())
+async def create_workflow(workflow: WorkflowCreate, db: AsyncSession = Depends(get_db)):
+    # A fresh workflow has no steps; setting the collection up front means the response
+    # never needs to load it (a refresh would expire it again)
+    db_workflow = Workflow(**workflow.model_dump(), steps=[])
     db.add(db_workflow)
-    db.commit()
-    db.refresh(db_workflow)
+    await db.commit()
     return db_workflow
 
 @app.get("/api/workflows/{workflow_id}", response_model=WorkflowResponse)
-def get_workflow(workflow_id: int, db: Session = Depends(get_db)):
-    wf = db.query(Workflow).filter(Workflow.id == workflow_id).first()
+async def get_workflow(workflow_id: int, db: AsyncSession = Depends(get_db)):
+    wf = (await db.execute(
+        select(Workflow).where(Workflow.id == workflow_id).options(*WORKFLOW_LOAD_OPTIONS)
+    )).scalars().first()
     if not wf:
         raise HTTPException(status_code=404, detail="Workflow not found")
     return wf
 
 # ------------------ Step Routes ------------------
 @app.post("/api/workflows/{workflow_id}/steps", response_model=StepResponse)
-def add_step(workflow_id: int, step: StepCreate, db: Session = Depends(get_db)):
-    wf = db.query(Workflow).filter(Workflow.id == workflow_id).first()
-    if not wf:
+async def add_step(workflow_id: int, step: StepCreate, db: AsyncSession = Depends(get_db)):
+    if not await workflow_exists(db, workflow_id):
         raise HTTPException(status_code=404, detail="Workflow not found")
-    db_step = Step(workflow_id=workflow_id, **step.dict())
+    db_step = Step(workflow_id=workflow_id, **step.model_dump())
     db.add(db_step)
-    db.commit()
-    db.refresh(db_step)
+    await db.commit()
+    await db.refresh(db_step)
     return db_step
 
+@app.post("/api/workflows/{workflow_id}/steps:bulk", response_model=List[StepResponse])
+async def add_steps_bulk(workflow_id: int, payload: StepsBulkCreate, db: AsyncSession = Depends(get_db)):
+    # One transaction and one multi-row INSERT for the whole batch
+    async with db.begin():
+        if not await workflow_exists(db, workflow_id):
+            raise HTTPException(status_code=404, detail="Workflow not found")
+        if not payload.steps:
+            return []
+        db_steps = (await db.scalars(
+            insert(Step).returning(Step),
+            [{"workflow_id": workflow_id, **s.model_dump()} for s in payload.steps],
+        )).all()
+    return db_steps
+
 @app.get("/api/workflows/{workflow_id}/steps", response_model=List[StepResponse])
-def get_steps(workflow_id: int, db: Session = Depends(get_db)):
-    return db.query(Step).filter(Step.workflow_id == workflow_id).all()
+async def get_steps(workflow_id: int, db: AsyncSession = Depends(get_db)):
+    return (await db.execute(select(Step).where(Step.workflow_id == workflow_id))).scalars().all()
 
 # ------------------ Gemini AI Integration ------------------
 try:
@@ -131,79 +181,97 @@ if genai and GEMINI_API_KEY:
     except Exception:
         _gemini_model = None
 
+# Gemini calls block a thread each; a dedicated bounded pool keeps many concurrent runs
+# from crowding out the default executor
+AI_POOL = concurrent.futures.ThreadPoolExecutor(
+    max_workers=int(os.getenv("AI_WORKERS", "8")), thread_name_prefix="gemini"
+)
+
 from typing import Optional
 
+PREVIOUS_RESULT_PREFIX = "Previous result:\n"
+NEW_INSTRUCTION_PREFIX = "\n\nNew instruction:\n"
+
 async def generate_ai_text(prompt: str, previous_output: Optional[str] = None) -> str:
     if not _gemini_model:
         return f"[AI disabled] {prompt}"
-    full_prompt = prompt if not previous_output else (
-        f"Previous result:\n{previous_output}\n\nNew instruction:\n{prompt}"
-    )
+    # Sent as separate parts of one user turn so a long previous output is handed to the
+    # SDK as-is instead of being copied into a freshly concatenated prompt every step
+    contents = prompt if not previous_output else [
+        PREVIOUS_RESULT_PREFIX, previous_output, NEW_INSTRUCTION_PREFIX, prompt
+    ]
     def _call() -> str:
         try:
-            res = _gemini_model.generate_content(full_prompt)
+            res = _gemini_model.generate_content(contents)
             return getattr(res, "text", "") or "[empty result]"
         except Exception as e:  # pragma: no cover
             return f"[AI error] {e}"
-    return await asyncio.to_thread(_call)
+    return await asyncio.get_running_loop().run_in_executor(AI_POOL, _call)
 
 # ------------------ WebSocket: Run Workflow ------------------
+# Step results are committed every STEP_COMMIT_BATCH steps (and once at the end) rather
+# than per step; the WebSocket still reports every step as soon as it is generated.
+STEP_COMMIT_BATCH = int(os.getenv("STEP_COMMIT_BATCH", "5"))
+
 @app.websocket("/ws/workflows/{workflow_id}/run")
 async def ws_run_workflow(ws: WebSocket, workflow_id: int):
+    # Keep-alive is handled by uvicorn's protocol-level ping frames (--ws-ping-interval)
     await ws.accept()
-    db = SessionLocal()
-    stop = asyncio.Event()
+    next_result: Optional[asyncio.Task] = None
+    async with session_scope() as db:
+        try:
+            if not await workflow_exists(db, workflow_id):
+                await ws.send_json({"type": "error", "message": "Workflow not found", "status": 404})
+                return
 
-    async def _heartbeat() -> None:
-        while not stop.is_set():
-            try:
-                await asyncio.sleep(20)
-                await ws.send_json({"type": "ping"})
-            except Exception:
-                break
+            steps = (await db.execute(
+                select(Step).where(Step.workflow_id == workflow_id).order_by(Step.id.asc())
+            )).scalars().all()
+            await ws.send_json({"type": "status", "message": f"Started workflow {workflow_id} with {len(steps)} steps"})
 
-    hb = asyncio.create_task(_heartbeat())
-    try:
-        wf = db.query(Workflow).filter(Workflow.id == workflow_id).first()
-        if not wf:
-            await ws.send_json({"type": "error", "message": "Workflow not found", "status": 404})
-            return
-
-        steps = db.query(Step).filter(Step.workflow_id == workflow_id).order_by(Step.id.asc()).all()
-        await ws.send_json({"type": "status", "message": f"Started workflow {wf.id} with {len(steps)} steps"})
-
-        previous_output: Optional[str] = None
-        for idx, step in enumerate(steps, start=1):
-            await ws.send_json({"type": "status", "message": f"Generating step {idx}"})
-            result_text = await generate_ai_text(step.prompt, previous_output)
-
-            step.result = result_text
-            step.progress = 100
-            db.add(step)
-            db.commit()
-            db.refresh(step)
-
-            await ws.send_json({
-                "type": "result",
-                "step": idx,
-                "prompt": step.prompt,
-                "result": result_text
-            })
-            previous_output = result_text
-
-        await ws.send_json({"type": "status", "message": "Workflow complete"})
-    except WebSocketDisconnect:
-        pass
-    except Exception as e:
-        try:
-            await ws.send_json({"type": "error", "message": str(e)})
-        except Exception:
+            # The next step is generated as soon as its input exists, so the commit and
+            # WebSocket send for step N overlap with the AI call for step N+1
+            if steps:
+                next_result = asyncio.create_task(generate_ai_text(steps[0].prompt))
+            for idx, step in enumerate(steps, start=1):
+                await ws.send_json({"type": "status", "message": f"Generating step {idx}"})
+                result_text = await next_result
+                if idx < len(steps):
+                    next_result = asyncio.create_task(generate_ai_text(steps[idx].prompt, result_text))
+
+                # Left dirty in the session, not flushed: flushing would take SQLite's write
+                # lock and hold it across the following AI calls until the batch commits
+                step.result = result_text
+                step.progress = 100
+                if idx % STEP_COMMIT_BATCH == 0:
+                    await db.commit()
+
+                await ws.send_json({
+                    "type": "result",
+                    "step": idx,
+                    "prompt": step.prompt,
+                    "result": result_text
+                })
+
+            await db.commit()
+            await ws.send_json({"type": "status", "message": "Workflow complete"})
+        except WebSocketDisconnect:
             pass
-    finally:
-        stop.set()
-        hb.cancel()
-        db.close()
-        try:
-            await ws.close()
-        except Exception:
-            pass
\ No newline at end of file
+        except Exception as e:
+            try:
+                await ws.send_json({"type": "error", "message": str(e)})
+            except Exception:
+                pass
+        finally:
+            if next_result:
+                next_result.cancel()
+            try:
+                # Persist whatever finished before a disconnect or error
+                if db.dirty:
+                    await db.commit()
+            except Exception:
+                await db.rollback()
+            try:
+                await ws.close()
+            except Exception:
+                pass
\ No newline at end of file
@@ -1,6 +1,6 @@
-from sqlalchemy import Column, Integer, String, ForeignKey, Text
+from sqlalchemy import Column, Integer, String, ForeignKey, Text, Index, inspect
 from sqlalchemy.orm import declarative_base, relationship
-from pydantic import BaseModel
+from pydantic import BaseModel, ConfigDict
 from typing import List, Optional
 
 Base = declarative_base()
@@ -11,69 +11,82 @@ class Workflow(Base):
     __tablename__ = "workflows"
 
     id = Column(Integer, primary_key=True, index=True)
-    name = Column(String, index=True, nullable=False)
+    name = Column(String, nullable=False)
     description = Column(Text, nullable=True)
 
-    # Relationship: One Workflow → Many WorkflowSteps
-    steps = relationship("WorkflowStep", back_populates="workflow", cascade="all, delete-orphan")
+    # Relationship: One Workflow → Many Steps
+    steps = relationship("Step", back_populates="workflow", cascade="all, delete-orphan")
 
 
-class WorkflowStep(Base):
-    __tablename__ = "workflow_steps"
+class Step(Base):
+    __tablename__ = "steps"
+    # Serves both "steps of workflow X" and "... ORDER BY id" straight from the B-tree;
+    # the workflow_id prefix also covers plain workflow_id lookups and the selectin IN-query
+    __table_args__ = (Index("ix_steps_workflow_id_id", "workflow_id", "id"),)
 
     id = Column(Integer, primary_key=True, index=True)
-    step_number = Column(Integer, nullable=False)
+    workflow_id = Column(Integer, ForeignKey("workflows.id"))
     prompt = Column(Text, nullable=False)
+    result = Column(Text, nullable=True)
+    progress = Column(Integer, nullable=True)
 
-    workflow_id = Column(Integer, ForeignKey("workflows.id"), nullable=False)
     workflow = relationship("Workflow", back_populates="steps")
 
 
 # --- Pydantic Schemas (for API requests/responses) ---
 
-class WorkflowStepBase(BaseModel):
-    step_number: int
+class StepCreate(BaseModel):
     prompt: str
+    result: Optional[str] = None
+    progress: Optional[int] = None
 
 
-class WorkflowStepCreateModel(WorkflowStepBase):
-    pass
+class StepsBulkCreate(BaseModel):
+    steps: List[StepCreate]
 
 
-class WorkflowStepModel(WorkflowStepBase):
-    id: int
+class StepResponse(StepCreate):
+    model_config = ConfigDict(from_attributes=True)
 
-    class Config:
-        orm_mode = True
+    id: int
 
 
-class WorkflowBase(BaseModel):
+class WorkflowCreate(BaseModel):
     name: str
     description: Optional[str] = None
 
 
-class WorkflowCreateModel(WorkflowBase):
-    pass
-
+class WorkflowResponse(WorkflowCreate):
+    model_config = ConfigDict(from_attributes=True)
 
-class WorkflowModel(WorkflowBase):
     id: int
-    steps: List[WorkflowStepModel] = []
+    steps: List[StepResponse] = []
 
-    class Config:
-        orm_mode = True
 
+class WorkflowPage(BaseModel):
+    items: List[WorkflowResponse]
+    next_cursor: Optional[int] = None
 
-# --- Database Creation Helper ---
-def create_db_and_tables(engine=None):
-    from sqlalchemy import create_engine
-    import os
 
-    if engine is None:
-        DATABASE_URL = os.getenv("DATABASE_URL")
-        if not DATABASE_URL:
-            raise ValueError("DATABASE_URL environment variable is not set.")
-        engine = create_engine(DATABASE_URL)
+# Build validators/serializers at import time rather than on the first request
+WorkflowResponse.model_rebuild()
+WorkflowPage.model_rebuild()
 
-    Base.metadata.create_all(bind=engine)
 
+# --- Database Creation Helper ---
+def _create_missing_indexes(sync_conn):
+    for table in Base.metadata.sorted_tables:
+        for index in table.indexes:
+            index.create(sync_conn, checkfirst=True)
+
+
+async def create_db_and_tables(engine):
+    # One table-list query on startup; create_all (a PRAGMA/SELECT per table) only
+    # runs when something is actually missing
+    async with engine.begin() as conn:
+        existing = set(await conn.run_sync(lambda sync_conn: inspect(sync_conn).get_table_names()))
+        if not existing.issuperset(Base.metadata.tables):
+            await conn.run_sync(Base.metadata.create_all)
+        else:
+            # create_all only indexes tables it creates; add any index introduced since
+            await conn.run_sync(_create_missing_indexes)
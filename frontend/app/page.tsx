@@ -12,6 +12,11 @@ type Workflow = {
   steps: { id: number; step_number: number; prompt: string }[];
 };
 
+type WorkflowPage = {
+  items: Workflow[];
+  next_cursor: number | null;
+};
+
 export default function Home() {
   // The main page now only manages the core state
   const [workflows, setWorkflows] = useState<Workflow[]>([]);
@@ -24,11 +29,18 @@ export default function Home() {
       const backendUrl = process.env.NEXT_PUBLIC_BACKEND_URL || 'https://ai-orchestrator-backend.onrender.com';
       console.log('Fetching workflows from:', backendUrl); // Debug log
       
-      const response = await fetch(`${backendUrl}/api/workflows`);
-      if (!response.ok) {
-        throw new Error(`HTTP error! status: ${response.status}`);
+      // The list endpoint is paginated; follow next_cursor until the last page
+      const data: Workflow[] = [];
+      let cursor: number | null = 0;
+      while (cursor !== null) {
+        const response = await fetch(`${backendUrl}/api/workflows?cursor=${cursor}`);
+        if (!response.ok) {
+          throw new Error(`HTTP error! status: ${response.status}`);
+        }
+        const page: WorkflowPage = await response.json();
+        data.push(...page.items);
+        cursor = page.next_cursor;
       }
-      const data: Workflow[] = await response.json();
       console.log('Fetched workflows:', data); // Debug log
       
       setWorkflows(data);